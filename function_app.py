@@ -5,6 +5,11 @@ import os
 import re
 import datetime as dt
 import asyncio
+import typing
+import uuid
+import time
+import threading
+from contextlib import contextmanager, ExitStack
 from urllib.parse import urlencode
 # heavy imports
 # from shared.auth import validate_bearer
@@ -15,27 +20,205 @@ from urllib.parse import urlencode
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
 
+# stay well under the Functions HTTP timeout (230s) so long-polls return cleanly
+MARKER_FEED_MAX_WAIT = float(os.getenv("MARKER_FEED_MAX_WAIT", "25"))
+# how far behind the feed cursor to re-read, must cover writer clock skew plus insert-to-commit time
+MARKER_FEED_OVERLAP_SECONDS = float(os.getenv("MARKER_FEED_OVERLAP_SECONDS", "30"))
+# cap on meeting ids per get_meetings_bulk call
+BULK_MAX_MEETING_IDS = int(os.getenv("BULK_MAX_MEETING_IDS", "100"))
+# max rows per export_markers page, use tools/export_markers.py for full ranges
+EXPORT_PAGE_MAX_ROWS = int(os.getenv("EXPORT_PAGE_MAX_ROWS", "5000"))
+# concurrent Graph calls per fan-out, keep at or under shared.graph.GRAPH_POOL_MAXSIZE
+GRAPH_MAX_WORKERS = int(os.getenv("GRAPH_MAX_WORKERS", "8"))
+# times process_meeting_batch re-queues a failed message before dropping it
+SB_BATCH_MAX_RETRIES = int(os.getenv("SB_BATCH_MAX_RETRIES", "5"))
+# re-queued batch messages are scheduled with exponential backoff from this base, capped at the max
+SB_BATCH_RETRY_BASE_SECONDS = float(os.getenv("SB_BATCH_RETRY_BASE_SECONDS", "30"))
+SB_BATCH_RETRY_MAX_SECONDS = float(os.getenv("SB_BATCH_RETRY_MAX_SECONDS", "900"))
+# where process_meeting_batch parks messages it can't process, drain it into tools/replay_events.py
+SB_FAILED_QUEUE_NAME = os.getenv("SB_FAILED_QUEUE_NAME", "teams-marker-queue-failed")
+# opt in to the process_meeting_batch trigger (off by default so the queue keeps a single consumer)
+PROCESS_MEETING_BATCH_ENABLED = os.getenv("PROCESS_MEETING_BATCH_ENABLED", "").lower() in ("1", "true", "yes")
+# max seconds a request waits for a pooled DB connection before getting a 503
+DB_CHECKOUT_TIMEOUT = float(os.getenv("DB_CHECKOUT_TIMEOUT", "5"))
+# requests already waiting on the pool at which each priority is turned away
+DB_ADMISSION = {
+    "write": int(os.getenv("DB_WRITE_MAX_WAITING", "4")),
+    "read": int(os.getenv("DB_READ_MAX_WAITING", "10")),
+    "health": int(os.getenv("DB_HEALTH_MAX_WAITING", "20")),
+}
+DB_RETRY_AFTER_SECONDS = int(os.getenv("DB_RETRY_AFTER_SECONDS", "2"))
+# read replica (optional, POSTGRES_READ_URL): reads fall back to the primary when it lags past this
+POSTGRES_READ_MAX_LAG_SECONDS = float(os.getenv("POSTGRES_READ_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+# short checkout on the replica so an unreachable one costs little before falling back
+REPLICA_CHECKOUT_TIMEOUT = float(os.getenv("REPLICA_CHECKOUT_TIMEOUT", "1"))
+REPLICA_COOLDOWN_SECONDS = float(os.getenv("REPLICA_COOLDOWN_SECONDS", "30"))
+
+def _make_pool(conninfo: str):
+    from psycopg_pool import ConnectionPool  # import here to avoid startup failures
+    return ConnectionPool(
+        conninfo=conninfo,
+        min_size=1,
+        max_size=5,
+        # don't attempt to open connections at construction time
+        wait=True,
+        # bound checkout waits so a spike can't hang request threads until the host timeout
+        timeout=DB_CHECKOUT_TIMEOUT,
+        max_waiting=DB_ADMISSION["health"],
+        kwargs={"connect_timeout": 5}
+    )
+
 #pool = ConnectionPool(conninfo=os.getenv("POSTGRES_URL"), min_size=1, max_size=5)
 _pool = None
 def get_pool():
     """Create the psycopg pool lazily to avoid blocking module import."""
     global _pool
     if _pool is None:
-        from psycopg_pool import ConnectionPool  # import here to avoid startup failures
         conninfo = os.getenv("POSTGRES_URL")
         # Fail fast with a clear error instead of hanging
         if not conninfo:
             raise RuntimeError("POSTGRES_URL is not set")
-        _pool = ConnectionPool(
-            conninfo=conninfo,
-            min_size=1,
-            max_size=5,
-            # don't attempt to open connections at construction time
-            wait=True,
-            kwargs={"connect_timeout": 5}
-        )
+        _pool = _make_pool(conninfo)
     return _pool
 
+_read_pool = None
+def get_read_pool():
+    """Pool for the read replica at POSTGRES_READ_URL, or None when no replica is configured."""
+    global _read_pool
+    if _read_pool is None:
+        conninfo = os.getenv("POSTGRES_READ_URL")
+        if not conninfo:
+            return None
+        _read_pool = _make_pool(conninfo)
+    return _read_pool
+
+# last measured replica lag, and when to try the replica again after a failure
+_replica = {"lag_seconds": None, "lag_checked_at": 0.0, "unhealthy_until": 0.0}
+_replica_lock = threading.Lock()
+_RX_LSN = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+def read_after_token(req: func.HttpRequest):
+    """Read-your-writes token (a primary WAL LSN returned by writes as X-Read-After), if the client sent a valid one."""
+    token = req.headers.get("X-Read-After") or req.params.get("read_after")
+    return token if token and _RX_LSN.match(token) else None
+
+class PoolOverloaded(Exception):
+    """Raised when a DB checkout is shed by admission control or times out waiting."""
+
+# pool wait/rejection counters, reported by db_check
+_pool_metrics = {"checkouts": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0, "replica_fallbacks": 0,
+                 "rejected": {p: 0 for p in DB_ADMISSION}}
+_pool_metrics_lock = threading.Lock()
+
+def _reject(priority: str, reason: str):
+    with _pool_metrics_lock:
+        _pool_metrics["rejected"][priority] += 1
+    logging.warning("DB admission rejected priority=%s: %s", priority, reason)
+    raise PoolOverloaded(reason)
+
+def _checkout(stack: ExitStack, pool, priority: str):
+    from psycopg_pool import PoolTimeout, TooManyRequests
+    waiting = pool.get_stats().get("requests_waiting", 0)
+    if waiting >= DB_ADMISSION[priority]:
+        _reject(priority, f"{waiting} requests waiting for a DB connection")
+
+    started = time.monotonic()
+    try:
+        conn = stack.enter_context(pool.connection(timeout=DB_CHECKOUT_TIMEOUT))
+    except (PoolTimeout, TooManyRequests) as e:
+        _reject(priority, str(e))
+    wait_ms = (time.monotonic() - started) * 1000
+    with _pool_metrics_lock:
+        _pool_metrics["checkouts"] += 1
+        _pool_metrics["wait_ms_total"] += wait_ms
+        _pool_metrics["wait_ms_max"] = max(_pool_metrics["wait_ms_max"], wait_ms)
+    return conn
+
+def _replica_fresh(conn, read_after: str = None) -> bool:
+    """Whether this replica connection can serve the read: replayed past read_after and within the lag limit."""
+    now = time.monotonic()
+    with conn.cursor() as cur:
+        if read_after:
+            cur.execute("SELECT pg_last_wal_replay_lsn() >= %s::pg_lsn", (read_after,))
+            if not cur.fetchone()[0]:
+                return False
+        if now - _replica["lag_checked_at"] >= REPLICA_LAG_CHECK_SECONDS:
+            # an idle primary stops advancing the replay timestamp, so no pending WAL counts as zero lag,
+            # but only while the receiver is streaming: a disconnected one also has nothing pending
+            cur.execute("""
+                SELECT (SELECT status FROM pg_stat_wal_receiver),
+                       CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+            """)
+            status, lag = cur.fetchone()
+            with _replica_lock:
+                _replica["lag_seconds"] = float(lag) if lag is not None and status == "streaming" else None
+                _replica["lag_checked_at"] = now
+                if status != "streaming":
+                    _replica["unhealthy_until"] = now + REPLICA_COOLDOWN_SECONDS
+            if status != "streaming":
+                logging.warning("Read replica WAL receiver is %s, using primary for %ss",
+                                status or "not running", REPLICA_COOLDOWN_SECONDS)
+    lag = _replica["lag_seconds"]
+    return lag is not None and lag <= POSTGRES_READ_MAX_LAG_SECONDS
+
+def _replica_checkout(stack: ExitStack, read_after: str = None):
+    """A replica connection for a read, or None to send the read to the primary."""
+    from psycopg_pool import PoolTimeout, TooManyRequests
+    pool = get_read_pool()
+    if pool is None or time.monotonic() < _replica["unhealthy_until"]:
+        return None
+    replica = ExitStack()
+    try:
+        if pool.get_stats().get("requests_waiting", 0) >= DB_ADMISSION["read"]:
+            raise TooManyRequests("read replica pool saturated")
+        conn = replica.enter_context(pool.connection(timeout=REPLICA_CHECKOUT_TIMEOUT))
+        fresh = _replica_fresh(conn, read_after)
+    except (PoolTimeout, TooManyRequests):
+        # replica is busy, not broken: send just this read to the primary
+        replica.close()
+        fresh = False
+    except Exception:
+        replica.close()
+        logging.exception("Read replica unavailable, using primary for %ss", REPLICA_COOLDOWN_SECONDS)
+        with _replica_lock:
+            _replica["unhealthy_until"] = time.monotonic() + REPLICA_COOLDOWN_SECONDS
+        fresh = False
+    else:
+        if fresh:
+            stack.enter_context(replica)
+            return conn
+        replica.close()
+    with _pool_metrics_lock:
+        _pool_metrics["replica_fallbacks"] += 1
+    return None
+
+@contextmanager
+def db_connection(priority: str = "write", read_after: str = None, replica: bool = True):
+    """Check a connection out of the pool with admission control.
+
+    Each priority ("health", "read", "write") is shed once the pool's wait queue reaches its
+    DB_ADMISSION threshold, so writes back off first and health checks last. Reads go to the
+    replica when one is configured, healthy and caught up to read_after, otherwise the primary.
+    Pass replica=False for reads that must see every committed write.
+    """
+    with ExitStack() as stack:
+        conn = _replica_checkout(stack, read_after) if priority == "read" and replica else None
+        if conn is None:
+            conn = _checkout(stack, get_pool(), priority)
+        yield conn
+
+def _parse_utc(value: str) -> dt.datetime:
+    """ISO timestamp from a client, accepting Z and treating a missing offset as UTC."""
+    parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt.timezone.utc)
+
+def _overloaded_response(e: PoolOverloaded) -> func.HttpResponse:
+    return func.HttpResponse(
+        f"Service overloaded, retry later: {e}", status_code=503,
+        headers={"Retry-After": str(DB_RETRY_AFTER_SECONDS)})
+
 
 @app.function_name(name="ping")
 @app.route(route="ping", methods=["GET"])
@@ -45,6 +228,7 @@ def ping(req: func.HttpRequest) -> func.HttpResponse:
 @app.route(route="add_marker", methods=["POST"])
 def add_marker(req: func.HttpRequest) -> func.HttpResponse:
     try:
+        from shared import feed
         #user = validate_bearer(req.headers.get("Authorization"))
         #print("Authenticated user:", user)
         req_body = req.get_json()
@@ -60,8 +244,7 @@ def add_marker(req: func.HttpRequest) -> func.HttpResponse:
         
         utc_timestamp = dt.datetime.now(dt.timezone.utc)
 
-        pool = get_pool()
-        with pool.connection() as conn, conn.cursor() as cur:
+        with db_connection("write") as conn, conn.cursor() as cur:
             cur.execute("INSERT INTO meetings (id) VALUES (%s) ON CONFLICT (id) DO NOTHING", (meeting_id,))
             cur.execute("""
                 INSERT INTO markers (meeting_id, label, utc_timestamp, user_id)
@@ -69,22 +252,34 @@ def add_marker(req: func.HttpRequest) -> func.HttpResponse:
                 RETURNING id, meeting_id, label, utc_timestamp, user_id
             """, (meeting_id, label, utc_timestamp, dummy_user_id))
             new_marker = cur.fetchone() # fetched row of newly added marker
+
+            _id, meeting_id, label, utc_timestamp, user_id = new_marker
+
+            resp = {
+                "id": str(_id),
+                "meeting_id": meeting_id,
+                "label": label,
+                "utc_timestamp": utc_timestamp.isoformat(),
+                "user_id": str(user_id)
+            }
+            # delivered to subscribe_markers listeners only once the insert commits. Keys only: the
+            # label is unbounded and NOTIFY payloads must stay under 8000 bytes, waiters re-read the row
+            note = {k: resp[k] for k in ("id", "meeting_id", "utc_timestamp")}
+            cur.execute("SELECT pg_notify(%s, %s)", (feed.MARKER_CHANNEL, json.dumps(note)))
             conn.commit()
-        
-        _id, meeting_id, label, utc_timestamp, user_id = new_marker
-
-        resp = {
-            "id": str(_id),
-            "meeting_id": meeting_id,
-            "label": label,
-            "utc_timestamp": utc_timestamp.isoformat(),
-            "user_id": str(user_id)
-        }
+
+            headers = {}
+            if get_read_pool() is not None:
+                # clients echo this back on reads so the replica is only used once it has this write
+                cur.execute("SELECT pg_current_wal_lsn()::text")
+                headers["X-Read-After"] = cur.fetchone()[0]
         
         return func.HttpResponse(
-            json.dumps(resp), status_code=201, mimetype="application/json")
+            json.dumps(resp), status_code=201, headers=headers, mimetype="application/json")
     except ValueError:
         return func.HttpResponse("Invalid JSON", status_code=400)
+    except PoolOverloaded as e:
+        return _overloaded_response(e)
 
 @app.route(route="get_markers", methods=["GET"])
 def get_markers(req: func.HttpRequest) -> func.HttpResponse:
@@ -94,8 +289,7 @@ def get_markers(req: func.HttpRequest) -> func.HttpResponse:
         if not meeting_id:
             return func.HttpResponse("Missing meeting_id", status_code=400)
         
-        pool = get_pool()
-        with pool.connection() as conn, conn.cursor() as cur:
+        with db_connection("read", read_after_token(req)) as conn, conn.cursor() as cur:
             cur.execute("""
                 SELECT id, meeting_id, label, utc_timestamp
                 FROM markers
@@ -117,6 +311,84 @@ def get_markers(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps(markers_list), status_code=200, mimetype="application/json")
     except ValueError:
         return func.HttpResponse("Invalid JSON", status_code=400)
+    except PoolOverloaded as e:
+        return _overloaded_response(e)
+
+def _feed_page(meeting_id: str, since: dt.datetime, seen: set):
+    """Markers the client hasn't seen, plus the cursor for its next poll.
+
+    utc_timestamp comes from the writer's clock before the insert, not commit order, so a marker can
+    commit after a later-stamped one. Every read goes back MARKER_FEED_OVERLAP_SECONDS before `since`
+    and the cursor carries the ids already delivered inside that window so they aren't repeated.
+    """
+    # primary only: a marker that committed before subscribe() but hasn't replayed on the replica
+    # would otherwise be missed by this read after its NOTIFY had already fired
+    with db_connection("read", replica=False) as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, meeting_id, label, utc_timestamp
+            FROM markers
+            WHERE meeting_id = %s AND utc_timestamp > %s
+            ORDER BY utc_timestamp ASC
+        """, (meeting_id, since - dt.timedelta(seconds=MARKER_FEED_OVERLAP_SECONDS)))
+        markers = cur.fetchall()
+
+    latest = max([since] + [row[3] for row in markers])
+    horizon = latest - dt.timedelta(seconds=MARKER_FEED_OVERLAP_SECONDS)
+    next_seen = [str(row[0]) for row in markers if row[3] > horizon]
+    # Z rather than +00:00 so the cursor survives unencoded in a query string
+    cursor = latest.astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z") + "|" + ",".join(next_seen)
+
+    markers_list = [
+        {
+            "id": str(row[0]),
+            "meeting_id": row[1],
+            "label": row[2],
+            "utc_timestamp": row[3].isoformat()
+        } for row in markers if str(row[0]) not in seen
+    ]
+    return markers_list, cursor
+
+@app.route(route="subscribe_markers", methods=["GET"])
+async def subscribe_markers(req: func.HttpRequest) -> func.HttpResponse:
+    """Long-poll for new markers: returns unseen markers as soon as one exists, or an empty list
+    after `timeout` seconds. Every response carries an X-Feed-Cursor header that the client passes
+    back as ?cursor= on its next poll. The first poll may pass ?since=<timestamp> instead (naive
+    means UTC, an unencoded + that arrives as a space is accepted), default now. Without a cursor
+    the overlap window's markers are returned too, since the client hasn't seen any of them.
+    Async so a waiting client costs no worker thread, only the short DB reads run on one."""
+    from shared import feed
+    meeting_id = req.params.get("meeting_id")
+    if not meeting_id:
+        return func.HttpResponse("Missing meeting_id", status_code=400)
+
+    try:
+        cursor = req.params.get("cursor")
+        since, _, seen = (cursor or req.params.get("since") or "").partition("|")
+        # an unencoded "+00:00" in the query string decodes to " 00:00"
+        since = _parse_utc(since.replace(" ", "+")) if since else dt.datetime.now(dt.timezone.utc)
+        seen = set(filter(None, seen.split(",")))
+        timeout = min(float(req.params.get("timeout") or MARKER_FEED_MAX_WAIT), MARKER_FEED_MAX_WAIT)
+    except ValueError:
+        return func.HttpResponse("Invalid cursor, since or timeout", status_code=400)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with feed.subscribe(meeting_id) as sub:
+        try:
+            # catch up on anything written since the client's last poll before waiting
+            markers_list, next_cursor = await asyncio.to_thread(_feed_page, meeting_id, since, seen)
+            # notifications only carry keys, so re-read the rows each time one arrives
+            while not markers_list:
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not await sub.wait(remaining):
+                    break
+                markers_list, next_cursor = await asyncio.to_thread(_feed_page, meeting_id, since, seen)
+        except PoolOverloaded as e:
+            return _overloaded_response(e)
+
+    return func.HttpResponse(
+        json.dumps(markers_list), status_code=200, headers={"X-Feed-Cursor": next_cursor},
+        mimetype="application/json")
 
 @app.route(route="get_meetings", methods=["GET"])
 def get_meetings(req: func.HttpRequest) -> func.HttpResponse:
@@ -126,8 +398,7 @@ def get_meetings(req: func.HttpRequest) -> func.HttpResponse:
         if not meeting_id:
             return func.HttpResponse("Missing meeting_id", status_code=400)
 
-        pool = get_pool()
-        with pool.connection() as conn, conn.cursor() as cur:
+        with db_connection("read", read_after_token(req)) as conn, conn.cursor() as cur:
             cur.execute("""
                 SELECT id, artifacts_ready, recording_start_utc, recording_base_url
                 FROM meetings
@@ -149,24 +420,147 @@ def get_meetings(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps(meetings_list), status_code=200, mimetype="application/json")
     except ValueError:
         return func.HttpResponse("Invalid JSON", status_code=400)
+    except PoolOverloaded as e:
+        return _overloaded_response(e)
+
+@app.route(route="get_meetings_bulk", methods=["GET", "POST"])
+def get_meetings_bulk(req: func.HttpRequest) -> func.HttpResponse:
+    """Meetings and their markers for many meeting ids in two queries.
+    Ids come from ?meeting_ids=a,b,c or a POST body {"meeting_ids": [...]}."""
+    try:
+        if req.method == "POST":
+            req_body = req.get_json()
+            if not isinstance(req_body, dict):
+                return func.HttpResponse("Body must be a JSON object", status_code=400)
+            meeting_ids = req_body.get("meeting_ids") or []
+            if not isinstance(meeting_ids, list):
+                return func.HttpResponse("meeting_ids must be a list", status_code=400)
+        else:
+            meeting_ids = (req.params.get("meeting_ids") or "").split(",")
+    except ValueError:
+        return func.HttpResponse("Invalid JSON", status_code=400)
+
+    # dedupe but keep the caller's order for the response
+    meeting_ids = list(dict.fromkeys(str(m).strip() for m in meeting_ids if m and str(m).strip()))
+    if not meeting_ids:
+        return func.HttpResponse("Missing meeting_ids", status_code=400)
+    if len(meeting_ids) > BULK_MAX_MEETING_IDS:
+        return func.HttpResponse(
+            f"Too many meeting_ids (max {BULK_MAX_MEETING_IDS})", status_code=413)
+
+    try:
+        with db_connection("read", read_after_token(req)) as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, artifacts_ready, recording_start_utc, recording_base_url
+                FROM meetings
+                WHERE id = ANY(%s)
+            """, (meeting_ids,))
+            meetings = cur.fetchall()
+            cur.execute("""
+                SELECT id, meeting_id, label, utc_timestamp
+                FROM markers
+                WHERE meeting_id = ANY(%s)
+                ORDER BY meeting_id, utc_timestamp ASC
+            """, (meeting_ids,))
+            markers = cur.fetchall()
+    except PoolOverloaded as e:
+        return _overloaded_response(e)
+
+    result = {mid: {"meeting": None, "markers": []} for mid in meeting_ids}
+    for row in meetings:
+        result[row[0]]["meeting"] = {
+            "id": str(row[0]),
+            "artifacts_ready": row[1],
+            "recording_start_utc": row[2].isoformat() if row[2] else None,
+            "recording_base_url": row[3]
+        }
+    for row in markers:
+        result[row[1]]["markers"].append({
+            "id": str(row[0]),
+            "meeting_id": row[1],
+            "label": row[2],
+            "utc_timestamp": row[3].isoformat()
+        })
+
+    return func.HttpResponse(
+        json.dumps(result), status_code=200, mimetype="application/json")
+
+@app.route(route="export_markers", methods=["GET"])
+def export_markers(req: func.HttpRequest) -> func.HttpResponse:
+    """Markers joined with meeting metadata over [start, end) as CSV or JSONL, one keyset page per call.
+    Follow the X-Next-Cursor header with ?after=<cursor> until it is absent."""
+    import io
+    from shared import export
+    fmt = req.params.get("format", "jsonl")
+    if fmt not in ("csv", "jsonl"):
+        return func.HttpResponse("format must be csv or jsonl", status_code=400)
+    try:
+        # naive values mean UTC, same as tools/export_markers.py, not the DB session timezone
+        start, end = _parse_utc(req.params["start"]), _parse_utc(req.params["end"])
+        limit = min(int(req.params.get("limit") or EXPORT_PAGE_MAX_ROWS), EXPORT_PAGE_MAX_ROWS)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        after = req.params.get("after")
+        if after:
+            after_ts, after_id = after.split("|", 1)
+            # validate here so a bad cursor is a 400, not a uuid cast error in the DB
+            after = (_parse_utc(after_ts), str(uuid.UUID(after_id)))
+    except KeyError:
+        return func.HttpResponse("Missing start or end", status_code=400)
+    except ValueError:
+        return func.HttpResponse("Invalid start, end, limit or after", status_code=400)
+
+    try:
+        with db_connection("read", read_after_token(req)) as conn, conn.cursor() as cur:
+            rows = export.fetch_page(cur, start, end, limit, after)
+    except PoolOverloaded as e:
+        return _overloaded_response(e)
+
+    out = io.StringIO()
+    if fmt == "csv":
+        export.write_csv([rows], out, header=not after)
+    else:
+        export.write_jsonl([rows], out)
+
+    headers = {}
+    if len(rows) == limit:
+        last = rows[-1]
+        # Z rather than +00:00 so the cursor survives unencoded in a query string
+        ts = last["utc_timestamp"].astimezone(dt.timezone.utc).isoformat().replace("+00:00", "Z")
+        headers["X-Next-Cursor"] = f"{ts}|{last['id']}"
+    return func.HttpResponse(
+        out.getvalue(), status_code=200, headers=headers,
+        mimetype="text/csv" if fmt == "csv" else "application/x-ndjson")
 
 @app.route(route="db_check", methods=["GET"])
 def db_check(req: func.HttpRequest) -> func.HttpResponse:
-    pool = get_pool()
     logging.info('DB check function processing a request.')
-    with pool.connection() as conn, conn.cursor() as cur:
-        cur.execute("SELECT version();")
-        version = cur.fetchone()[0]
-        cur.execute("SELECT count(*) FROM meetings")
-        meetings = cur.fetchone()[0]
-        cur.execute("SELECT count(*) FROM markers")
-        markers = cur.fetchone()[0]
-        logging.info(f"PostgreSQL version: {version}, meetings count: {meetings}, markers count: {markers}")
+    try:
+        with db_connection("health") as conn, conn.cursor() as cur:
+            cur.execute("SELECT version();")
+            version = cur.fetchone()[0]
+            cur.execute("SELECT count(*) FROM meetings")
+            meetings = cur.fetchone()[0]
+            cur.execute("SELECT count(*) FROM markers")
+            markers = cur.fetchone()[0]
+            logging.info(f"PostgreSQL version: {version}, meetings count: {meetings}, markers count: {markers}")
+    except PoolOverloaded as e:
+        return _overloaded_response(e)
+
+    with _pool_metrics_lock:
+        metrics = dict(_pool_metrics, rejected=dict(_pool_metrics["rejected"]))
     return func.HttpResponse(
         json.dumps({
             "postgres_version": version,
             "meetings_count": meetings,
-            "markers_count": markers
+            "markers_count": markers,
+            "pool_stats": get_pool().get_stats(),
+            "pool_admission": metrics,
+            "replica": None if get_read_pool() is None else {
+                "pool_stats": get_read_pool().get_stats(),
+                "lag_seconds": _replica["lag_seconds"],
+                "healthy": time.monotonic() >= _replica["unhealthy_until"]
+            }
         }), status_code=200, mimetype="application/json")
 
 def parse_ce_resource(resource: str):
@@ -186,160 +580,293 @@ def parse_ce_resource(resource: str):
     
     return None
 
+def is_lifecycle_event(ev) -> bool:
+    data = ev.get("data", {}) if isinstance(ev, dict) else {}
+    ev_type = ev.get("type") or ev.get("eventType") or ""
+    return "LifecycleNotification" in ev_type or data.get("lifecycleEvent") is not None
+
+def collect_meeting_work(events, graph):
+    """Split Event Grid events into per-item (tenant_id, organizer_id, meeting_id, kind) work and
+    (tenant_id, organizer_id) pairs needing discovery. tenant_id is None for the default tenant.
+    Lifecycle notifications are handled here and, as before, end processing of the payload."""
+    per_item = []
+    per_org = set()
+
+    for ev in events:
+        logging.info("Processing event: %r", ev)
+        data = ev.get("data", {}) if isinstance(ev, dict) else {}
+        resource = data.get("resource") or ev.get("subject")
+        tenant_id = data.get("tenantId")
+        ev_type = ev.get("type") or ev.get("eventType") or ""
+        logging.info("EG evt id=%s type=%s keys=%s", ev.get("id"), ev_type, list(data.keys()))
+        # if not resource:
+        #     logging.warning("Event without resource: %s", ev); continue
+
+        # filters lifecycle notifications
+        if is_lifecycle_event(ev):
+            logging.info("LIFECYCLE EVENT RECEIVED")
+            lifecycle = data.get("lifecycleEvent")
+            subscription_id = data.get("subscriptionId")
+            client_state = data.get("clientState")
+
+            if os.getenv("GRAPH_SUBS_CLIENT_STATE") and client_state != os.getenv("GRAPH_SUBS_CLIENT_STATE"):
+                logging.warning("Mismatched client state secret, skipping")
+                continue
+            
+            try:
+                if lifecycle == "reauthorizationRequired":
+                    # graph.reauthorize_subscription(subscription_id)
+                    new_exp_date = (dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=23))
+                    new_exp_date = new_exp_date.strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
+                    graph.renew_subscription(subscription_id, new_exp_date, tenant_id=tenant_id)
+
+                elif lifecycle == "subscriptionRemoved":
+                    organizer_id = os.getenv("ORGANIZER_ID")
+                    if organizer_id:
+                        recreate_subscriptions(organizer_id, tenant_id=tenant_id)
+                    else:
+                        logging.warning("ORGANIZER_ID not set, cannot recreate subscriptions")
+
+                elif lifecycle == "missed":
+                    subs = graph.list_subscriptions(tenant_id=tenant_id)
+                    for sub in subs:
+                        exp_time_str = sub.get("expirationDateTime")
+                        sub_id = sub.get("id")
+                        if not exp_time_str or not sub_id:
+                            continue
+                        exp_time_dt = dt.datetime.fromisoformat(exp_time_str.replace("Z", "+00:00"))
+                        time_diff = exp_time_dt - dt.datetime.now(dt.timezone.utc)
+                        # if expiring within an hour and we get a missed notification, renew
+                        if time_diff < dt.timedelta(hours=1):
+                            new_exp_date = (dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=23))
+                            new_exp_date = new_exp_date.strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
+                            graph.renew_subscription(sub_id, new_exp_date, tenant_id=tenant_id)
+                
+                else:
+                    logging.info("Unhandled lifecycle event: %s", lifecycle)
+            except Exception:
+                logging.exception("Error handling lifecycle event: %s", lifecycle)
+
+            logging.info("Lifecycle event processed: %s", lifecycle)
+            return [], set()  # lifecycle events don't need further processing
+        
+        logging.info("CHANGE NOTIFICATION DETECTED")
+        parsed = parse_ce_resource(resource)
+        if not parsed:
+            logging.warning("Unrecognized resource: %s", resource); continue
+
+        if parsed["type"] == "agg":
+            per_org.add((tenant_id, parsed["organizer_id"]))
+        elif parsed["type"] == "item":
+            per_item.append((tenant_id, parsed["organizer_id"], parsed["meeting_id"], parsed["kind"]))
+                
+        logging.info("EventGrid event: kind=%s organizer=%s meeting=%s", parsed.get("kind"), parsed.get("organizer_id"), parsed.get("meeting_id"))
+
+    return per_item, per_org
+
+def _discover_org_meetings(graph, tenant_id: str, organizer_id: str):
+    touched = set()
+    try:
+        for r in graph.get_all_recordings(organizer_id, tenant_id=tenant_id):
+            meeting_id = r.get("meetingId")
+            touched.add(meeting_id) if meeting_id else None
+    except Exception:
+        logging.exception("getAllRecordings failed org=%s", organizer_id)
+    try:
+        for t in graph.get_all_transcripts(organizer_id, tenant_id=tenant_id):
+            meeting_id = t.get("meetingId")
+            touched.add(meeting_id) if meeting_id else None
+    except Exception:
+        logging.exception("getAllTranscripts failed org=%s", organizer_id)
+    return touched
+
+def resolve_meetings(graph, per_item, per_org, max_workers: int = GRAPH_MAX_WORKERS):
+    """Dedupe meetings across per-item and per-organizer work and look up recording starts in one Graph fan-out.
+
+    Returns (rows, failed): rows maps meeting_id -> (organizer_id, recording_start) ready to upsert,
+    failed maps meeting_id -> exception for per-item lookups that failed (per-organizer lookup
+    failures are logged and upserted without a start, as before).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    # meeting_id -> [tenant_id, organizer_id, needs recordings lookup, lookup failure is fatal]
+    targets = {}
+    for tenant_id, organizer_id, meeting_id, kind in per_item:
+        t = targets.setdefault(meeting_id, [tenant_id, organizer_id, False, False])
+        if kind == "recordings":
+            t[2] = t[3] = True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        # for organizers that sent aggregator events, discover which meetings to upsert
+        discovered = dict(zip(per_org, ex.map(lambda o: _discover_org_meetings(graph, *o), per_org)))
+        for (tenant_id, organizer_id), touched in discovered.items():
+            for meeting_id in touched:
+                t = targets.setdefault(meeting_id, [tenant_id, organizer_id, False, False])
+                t[2] = True
+
+        lookups = {
+            meeting_id: ex.submit(graph.list_recordings, organizer_id, meeting_id, tenant_id=tenant_id)
+            for meeting_id, (tenant_id, organizer_id, lookup, _) in targets.items() if lookup
+        }
+
+    rows = {}
+    failed = {}
+    for meeting_id, (_, organizer_id, lookup, strict) in targets.items():
+        recs = []
+        if lookup:
+            try:
+                recs = lookups[meeting_id].result()
+            except Exception as e:
+                logging.exception("list_recordings failed org=%s mid=%s", organizer_id, meeting_id)
+                if strict:
+                    failed[meeting_id] = e
+                    continue
+        rows[meeting_id] = (organizer_id, recs[0].get("createdDateTime") if recs else None)
+
+    return rows, failed
+
+def upsert_meetings(rows: dict):
+    """Write resolved meetings on a single connection and commit once."""
+    if not rows:
+        return
+    with db_connection("write") as conn, conn.cursor() as cur:
+        for meeting_id, (organizer_id, start) in rows.items():
+            base  = f"/users/{organizer_id}/onlineMeetings/{meeting_id}"
+            logging.info("Upserting meeting=%s start=%s base=%s", meeting_id, start, base)
+            cur.execute("INSERT INTO meetings (id) VALUES (%s) ON CONFLICT (id) DO NOTHING", (meeting_id,))
+            cur.execute("""
+                UPDATE meetings
+                SET artifacts_ready = TRUE,
+                    recording_start_utc = %s,
+                    recording_base_url  = %s,
+                    updated_at          = now()
+                WHERE id = %s
+            """, (start, base, meeting_id))
+        conn.commit()
+
+def _decode_events(msg: func.ServiceBusMessage):
+    raw = msg.get_body().decode("utf-8")
+    try:
+        payload = json.loads(raw)
+    except json.JSONDecodeError:
+        logging.error("ServiceBus message not JSON: %r", raw[:200])
+        return None, []
+    return payload, ([payload] if isinstance(payload, dict) else payload)
+
 @app.service_bus_queue_trigger(arg_name="msg", 
                                queue_name="teams-marker-queue", 
                                connection="SERVICE_BUS_CONNECTION_STRING")
 def process_meeting(msg: func.ServiceBusMessage):
     try:
         from shared import graph
-        raw = msg.get_body().decode("utf-8")
-        try:
-            payload = json.loads(raw)
-        except json.JSONDecodeError:
-            logging.error("ServiceBus message not JSON: %r", raw[:200])
+        _, events = _decode_events(msg)
+        if not events:
             return
 
-        if isinstance(payload, dict):
-            events = [payload]
-        else:
-            events = payload
+        per_item, per_org = collect_meeting_work(events, graph)
+        rows, failed = resolve_meetings(graph, per_item, per_org)
+        upsert_meetings(rows)
+
+        logging.info("process_meeting: items=%d organizers=%d", len(per_item), len(per_org))
+        if failed:
+            # surface the first lookup failure so the message is redelivered
+            raise next(iter(failed.values()))
+
+    except Exception:
+        logging.exception("process_meeting failed")
+        raise 
 
+# Batch variant of process_meeting on the same queue, registered only when PROCESS_MEETING_BATCH_ENABLED
+# is set. When enabling it, also disable the single-message trigger with AzureWebJobs.process_meeting.Disabled.
+if PROCESS_MEETING_BATCH_ENABLED:
+    @app.service_bus_queue_trigger(arg_name="msgs", 
+                                   queue_name="teams-marker-queue", 
+                                   connection="SERVICE_BUS_CONNECTION_STRING",
+                                   cardinality=func.Cardinality.MANY)
+    def process_meeting_batch(msgs: typing.List[func.ServiceBusMessage]):
+        from shared import graph
+
+        # merge every message's work, remembering which messages asked for what
         per_item = []
         per_org = set()
+        item_sources = {}  # meeting_id -> message indexes
+        failed_msgs = set()
+        poison = []  # (message index, reason)
 
-        for ev in events:
-            logging.info("Processing event: %r", ev)
-            data = ev.get("data", {}) if isinstance(ev, dict) else {}
-            resource = data.get("resource") or ev.get("subject")
-            ev_type = ev.get("type") or ev.get("eventType") or ""
-            logging.info("EG evt id=%s type=%s keys=%s", ev.get("id"), ev_type, list(data.keys()))
-            # if not resource:
-            #     logging.warning("Event without resource: %s", ev); continue
-
-            # filters lifecycle notifications
-            if "LifecycleNotification" in ev_type or data.get("lifecycleEvent") is not None:
-                logging.info("LIFECYCLE EVENT RECEIVED")
-                lifecycle = data.get("lifecycleEvent")
-                subscription_id = data.get("subscriptionId")
-                client_state = data.get("clientState")
-
-                if os.getenv("GRAPH_SUBS_CLIENT_STATE") and client_state != os.getenv("GRAPH_SUBS_CLIENT_STATE"):
-                    logging.warning("Mismatched client state secret, skipping")
+        for i, msg in enumerate(msgs):
+            try:
+                payload, events = _decode_events(msg)
+                if payload is None:
+                    poison.append((i, "not JSON"))
                     continue
-                
-                try:
-                    if lifecycle == "reauthorizationRequired":
-                        # graph.reauthorize_subscription(subscription_id)
-                        new_exp_date = (dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=23))
-                        new_exp_date = new_exp_date.strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
-                        graph.renew_subscription(subscription_id, new_exp_date)
-
-                    elif lifecycle == "subscriptionRemoved":
-                        organizer_id = os.getenv("ORGANIZER_ID")
-                        if organizer_id:
-                            recreate_subscriptions(organizer_id)
-                        else:
-                            logging.warning("ORGANIZER_ID not set, cannot recreate subscriptions")
-
-                    elif lifecycle == "missed":
-                        subs = graph.list_subscriptions()
-                        for sub in subs:
-                            exp_time_str = sub.get("expirationDateTime")
-                            sub_id = sub.get("id")
-                            if not exp_time_str or not sub_id:
-                                continue
-                            exp_time_dt = dt.datetime.fromisoformat(exp_time_str.replace("Z", "+00:00"))
-                            time_diff = exp_time_dt - dt.datetime.now(dt.timezone.utc)
-                            # if expiring within an hour and we get a missed notification, renew
-                            if time_diff < dt.timedelta(hours=1):
-                                new_exp_date = (dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=23))
-                                new_exp_date = new_exp_date.strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
-                                graph.renew_subscription(sub_id, new_exp_date)
-                    
-                    else:
-                        logging.info("Unhandled lifecycle event: %s", lifecycle)
-                except Exception:
-                    logging.exception("Error handling lifecycle event: %s", lifecycle)
+                if not events:
+                    continue
+                items, orgs = collect_meeting_work(events, graph)
+            except Exception:
+                # malformed events fail the same way every time, so park them rather than re-queue them
+                logging.exception("process_meeting_batch: message %s events could not be parsed: %r",
+                                  msg.message_id, msg.get_body()[:200])
+                poison.append((i, "events could not be parsed"))
+                continue
+            per_item.extend(items)
+            per_org.update(orgs)
+            for _, _, meeting_id, _ in items:
+                item_sources.setdefault(meeting_id, set()).add(i)
 
-                logging.info("Lifecycle event processed: %s", lifecycle)
-                return  # lifecycle events don't need further processing
-            
-            logging.info("CHANGE NOTIFICATION DETECTED")
-            parsed = parse_ce_resource(resource)
-            if not parsed:
-                logging.warning("Unrecognized resource: %s", resource); continue
-
-            if parsed["type"] == "agg":
-                per_org.add(parsed["organizer_id"])
-            elif parsed["type"] == "item":
-                per_item.append((parsed["organizer_id"], parsed["meeting_id"], parsed["kind"]))
-                    
-            logging.info("EventGrid event: kind=%s organizer=%s meeting=%s", parsed.get("kind"), parsed.get("organizer_id"), parsed.get("meeting_id"))
-
-        # process per-item first (cheapest, already gives meeting_id)
-        if per_item:
-            pool = get_pool()
-            with pool.connection() as conn, conn.cursor() as cur:
-                for organizer_id, meeting_id, kind in per_item:
-                    recs = graph.list_recordings(organizer_id, meeting_id) if kind == "recordings" else []
-                    start = recs[0].get("createdDateTime") if recs else None
-                    base  = f"/users/{organizer_id}/onlineMeetings/{meeting_id}"
-                    cur.execute("INSERT INTO meetings (id) VALUES (%s) ON CONFLICT (id) DO NOTHING", (meeting_id,))
-                    cur.execute("""
-                        UPDATE meetings
-                        SET artifacts_ready = TRUE,
-                            recording_start_utc = %s,
-                            recording_base_url  = %s,
-                            updated_at          = now()
-                        WHERE id = %s
-                    """, (start, base, meeting_id))
-                conn.commit()
+        rows, failed = resolve_meetings(graph, per_item, per_org)
+        for meeting_id in failed:
+            failed_msgs.update(item_sources.get(meeting_id, ()))
 
-        # for organizers that sent aggregator events, discover which meetings to upsert
-        for organizer_id in per_org:
-            touched = set()
-            try:
-                for r in graph.get_all_recordings(organizer_id):
-                    meeting_id = r.get("meetingId")
-                    touched.add(meeting_id) if meeting_id else None
-            except Exception:
-                logging.exception("getAllRecordings failed org=%s", organizer_id)
-            try:
-                for t in graph.get_all_transcripts(organizer_id):
-                    meeting_id = t.get("meetingId")
-                    touched.add(meeting_id) if meeting_id else None
-            except Exception:
-                logging.exception("getAllTranscripts failed org=%s", organizer_id)
+        # one write for the whole batch, a DB failure fails (and redelivers) every message
+        upsert_meetings(rows)
 
-            if not touched:
-                continue
+        logging.info("process_meeting_batch: messages=%d items=%d organizers=%d meetings=%d failed=%d poison=%d",
+                     len(msgs), len(per_item), len(per_org), len(rows), len(failed_msgs), len(poison))
 
-            with pool.connection() as conn, conn.cursor() as cur:
-                for meeting_id in touched:
-                    try:
-                        recs = graph.list_recordings(organizer_id, meeting_id)
-                    except Exception:
-                        logging.exception("list_recordings failed org=%s mid=%s", organizer_id, meeting_id)
-                        recs = []
-                    start = recs[0].get("createdDateTime") if recs else None
-                    base  = f"/users/{organizer_id}/onlineMeetings/{meeting_id}"
-                    logging.info("Upserting meeting=%s start=%s base=%s", meeting_id, start, base)
-                    cur.execute("INSERT INTO meetings (id) VALUES (%s) ON CONFLICT (id) DO NOTHING", (meeting_id,))
-                    cur.execute("""
-                        UPDATE meetings
-                        SET artifacts_ready = TRUE,
-                            recording_start_utc = %s,
-                            recording_base_url  = %s,
-                            updated_at          = now()
-                        WHERE id = %s
-                    """, (start, base, meeting_id))
-                conn.commit()
+        retries = []
+        for i in sorted(failed_msgs):
+            attempt = int((msgs[i].application_properties or {}).get("batch_retry", 0)) + 1
+            if attempt > SB_BATCH_MAX_RETRIES:
+                poison.append((i, f"Graph lookups failed after {attempt - 1} retries"))
+            else:
+                retries.append((i, attempt))
+        if retries or poison:
+            _settle_batch_failures(msgs, retries, poison)
 
-        logging.info("process_meeting: items=%d organizers=%d", len(per_item), len(per_org))
+def _settle_batch_failures(msgs, retries, poison):
+    """Settle failures per message so the rest of the batch still completes: re-queue Graph failures
+    with backoff, park poison messages on SB_FAILED_QUEUE_NAME with their original body."""
+    from azure.servicebus import ServiceBusClient, ServiceBusMessage
+    conn = os.getenv("SERVICE_BUS_CONNECTION_STRING")
+    now = dt.datetime.now(dt.timezone.utc)
 
-    except Exception:
-        logging.exception("process_meeting failed")
-        raise 
+    with ServiceBusClient.from_connection_string(conn) as client, \
+            client.get_queue_sender(queue_name="teams-marker-queue") as retry_sender, \
+            client.get_queue_sender(queue_name=SB_FAILED_QUEUE_NAME) as failed_sender:
+        for i, attempt in retries:
+            msg = msgs[i]
+            delay = min(SB_BATCH_RETRY_BASE_SECONDS * 2 ** (attempt - 1), SB_BATCH_RETRY_MAX_SECONDS)
+            try:
+                retry_sender.send_messages(ServiceBusMessage(
+                    msg.get_body(),
+                    application_properties={"batch_retry": attempt},
+                    scheduled_enqueue_time_utc=now + dt.timedelta(seconds=delay)))
+                logging.warning("process_meeting_batch: re-queued message %s attempt=%d in %ss",
+                                msg.message_id, attempt, delay)
+            except Exception:
+                logging.exception("process_meeting_batch: could not re-queue message %s: %r",
+                                  msg.message_id, msg.get_body()[:200])
+        for i, reason in poison:
+            msg = msgs[i]
+            try:
+                failed_sender.send_messages(ServiceBusMessage(
+                    msg.get_body(),
+                    application_properties={"failure_reason": reason, "original_message_id": msg.message_id}))
+                logging.error("process_meeting_batch: moved message %s to %s: %s",
+                              msg.message_id, SB_FAILED_QUEUE_NAME, reason)
+            except Exception:
+                logging.exception("process_meeting_batch: could not park message %s (%s): %r",
+                                  msg.message_id, reason, msg.get_body()[:200])
 
 #smoke testing graph functions
 @app.route(route="debug_fetch_artifacts", methods=["POST"])
@@ -350,18 +877,19 @@ def debug_fetch_artifacts(req: func.HttpRequest) -> func.HttpResponse:
         organizer_id = req_body.get("organizer_id")
         meeting_id = req_body.get("online_meeting_id")
         join_url = req_body.get("join_url")
+        tenant_id = req_body.get("tenant_id")
         #transcript_id = req_body.get("transcript_id")
         #recording_id = req_body.get("recording_id")
 
         if organizer_id is None:
             return func.HttpResponse("No Organizer ID", status_code=400)
         if meeting_id is None:
-            meeting_id = graph.resolve_meeting_by_join_url(join_web_url=join_url, organizer_id=organizer_id)
+            meeting_id = graph.resolve_meeting_by_join_url(join_web_url=join_url, organizer_id=organizer_id, tenant_id=tenant_id)
             if meeting_id is None:
                 return func.HttpResponse("Cannot resolve meeting by join URL", status_code=400)
 
-        transcripts = graph.list_transcripts(organizer_id=organizer_id, online_meeting_id=meeting_id)
-        recordings = graph.list_recordings(organizer_id=organizer_id, online_meeting_id=meeting_id)
+        transcripts = graph.list_transcripts(organizer_id=organizer_id, online_meeting_id=meeting_id, tenant_id=tenant_id)
+        recordings = graph.list_recordings(organizer_id=organizer_id, online_meeting_id=meeting_id, tenant_id=tenant_id)
 
         response = {
             "online_meeting_id": meeting_id,
@@ -445,7 +973,9 @@ def create_subscriptions(req: func.HttpRequest) -> func.HttpResponse:
         print("Event Grid notification URL:", event_grid_notif_url)
         exp_date = (dt.datetime.now(dt.timezone.utc) + dt.timedelta(minutes=45)).replace(microsecond=0).isoformat()
         client_state = os.getenv("GRAPH_SUBS_CLIENT_STATE")
-        organizer_id = req.get_json().get("organizer_id")
+        req_body = req.get_json()
+        organizer_id = req_body.get("organizer_id")
+        tenant_id = req_body.get("tenant_id")
         #resources = [f"users/{organizer_id}/onlineMeetings/getAllRecordings", f"users/{organizer_id}/onlineMeetings/getAllTranscripts"]
         resources = ["onlineMeetings/getAllRecordings", "onlineMeetings/getAllTranscripts"]
 
@@ -455,7 +985,8 @@ def create_subscriptions(req: func.HttpRequest) -> func.HttpResponse:
                                             client_state=client_state,
                                             organizer_id=organizer_id,
                                             expiration_date=exp_date,
-                                            resource=r)
+                                            resource=r,
+                                            tenant_id=tenant_id)
             logging.info("Created subscription: %s", sub)
             created.append(sub)
 
@@ -464,7 +995,7 @@ def create_subscriptions(req: func.HttpRequest) -> func.HttpResponse:
         logging.exception("Error creating subscriptions")
         return func.HttpResponse(f"Exception occured: {e}", status_code=400)
     
-def recreate_subscriptions(organizer_id: str):
+def recreate_subscriptions(organizer_id: str, tenant_id: str = None):
     try:
         from shared import graph
         event_grid_notif_url = create_eventgrid_uri()
@@ -478,7 +1009,8 @@ def recreate_subscriptions(organizer_id: str):
                                             client_state=client_state,
                                             organizer_id=organizer_id,
                                             expiration_date=exp_date,
-                                            resource=r)
+                                            resource=r,
+                                            tenant_id=tenant_id)
             logging.info("Created subscription: %s", sub)
     except Exception as e:
         logging.exception("Error recreating subscriptions for organizer %s", organizer_id)
@@ -547,7 +1079,7 @@ def recreate_subscriptions(organizer_id: str):
 def list_subscriptions(req: func.HttpRequest) -> func.HttpResponse:
     try:
         from shared import graph
-        subs = graph.list_subscriptions()
+        subs = graph.list_subscriptions(tenant_id=req.params.get("tenant_id"))
         return func.HttpResponse(json.dumps({"subscriptions": subs}), status_code=200, mimetype="application/json")
     except Exception as e:
         logging.error(f"Cannot get HTTP session: {e}")
@@ -562,7 +1094,7 @@ def delete_subscription(req: func.HttpRequest) -> func.HttpResponse:
         if not subscription_id:
             return func.HttpResponse("Missing subscription_id", status_code=400)
         
-        graph.delete_subscription(subscription_id)
+        graph.delete_subscription(subscription_id, tenant_id=req_body.get("tenant_id"))
         return func.HttpResponse(f"Deleted subscription {subscription_id}", status_code=200)
     except Exception as e:
         logging.error(f"Cannot delete subscription: {e}")
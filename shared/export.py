@@ -0,0 +1,91 @@
+import csv
+import json
+import uuid
+import datetime as dt
+
+EXPORT_COLUMNS = [
+    "id", "meeting_id", "label", "utc_timestamp", "user_id", "offset_seconds",
+    "recording_start_utc", "recording_base_url",
+]
+
+# markers joined with their meeting's recording metadata over [start, end)
+_EXPORT_SELECT = """
+    SELECT m.id, m.meeting_id, m.label, m.utc_timestamp, m.user_id, m.offset_seconds,
+           mt.recording_start_utc, mt.recording_base_url
+    FROM markers m
+    LEFT JOIN meetings mt ON mt.id = m.meeting_id
+    WHERE m.utc_timestamp >= %s AND m.utc_timestamp < %s
+"""
+
+
+def _jsonable(value):
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def iter_chunks(conn, start, end, chunk_size: int = 5000):
+    """Yield lists of row dicts from a server-side cursor, at most chunk_size rows held at a time."""
+    with conn.transaction(), conn.cursor(name="export_markers") as cur:
+        cur.itersize = chunk_size
+        cur.execute(f"{_EXPORT_SELECT} ORDER BY m.utc_timestamp, m.id", (start, end))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield [dict(zip(EXPORT_COLUMNS, row)) for row in rows]
+
+
+def fetch_page(cur, start, end, limit: int, after=None):
+    """One keyset-paginated page of rows; `after` is the (utc_timestamp, id) of the last row already seen."""
+    if after:
+        cur.execute(f"{_EXPORT_SELECT} AND (m.utc_timestamp, m.id) > (%s, %s) ORDER BY m.utc_timestamp, m.id LIMIT %s",
+                    (start, end, after[0], after[1], limit))
+    else:
+        cur.execute(f"{_EXPORT_SELECT} ORDER BY m.utc_timestamp, m.id LIMIT %s", (start, end, limit))
+    return [dict(zip(EXPORT_COLUMNS, row)) for row in cur.fetchall()]
+
+
+def write_csv(chunks, out, header: bool = True):
+    """Write row chunks as CSV to a text file object."""
+    writer = csv.DictWriter(out, fieldnames=EXPORT_COLUMNS)
+    if header:
+        writer.writeheader()
+    for chunk in chunks:
+        writer.writerows({k: _jsonable(v) for k, v in row.items()} for row in chunk)
+
+
+def write_jsonl(chunks, out):
+    """Write row chunks as JSON lines to a text file object."""
+    for chunk in chunks:
+        out.write("".join(json.dumps({k: _jsonable(v) for k, v in row.items()}) + "\n" for row in chunk))
+
+
+def write_parquet(chunks, path: str):
+    """Write each chunk as a parquet row group. Needs pyarrow, which isn't a deployment dependency."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("meeting_id", pa.string()),
+        ("label", pa.string()),
+        ("utc_timestamp", pa.timestamp("us", tz="UTC")),
+        ("user_id", pa.string()),
+        ("offset_seconds", pa.int32()),
+        ("recording_start_utc", pa.timestamp("us", tz="UTC")),
+        ("recording_base_url", pa.string()),
+    ])
+    strings = {f.name for f in schema if pa.types.is_string(f.type)}
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            columns = {
+                name: [str(row[name]) if name in strings and row[name] is not None else row[name] for row in chunk]
+                for name in EXPORT_COLUMNS
+            }
+            writer.write_table(pa.table(columns, schema=schema))
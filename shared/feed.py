@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+
+# postgres channel that add_marker NOTIFYs on, payload is {"id", "meeting_id", "utc_timestamp"}
+MARKER_CHANNEL = "markers"
+
+_listener = None
+_listener_lock = threading.Lock()
+_subscribers = {}  # meeting_id -> set of Subscription
+_subscribers_lock = threading.Lock()
+
+
+class Subscription:
+    """A single waiting client for one meeting's new markers, woken on its own event loop."""
+
+    def __init__(self, meeting_id: str, loop: asyncio.AbstractEventLoop):
+        self.meeting_id = meeting_id
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self):
+        # called from the listener thread, so hand the wake-up to the waiter's loop
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            pass  # loop already closed, the waiter is gone
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait without holding a thread until a new marker is notified; False on timeout."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            self._event.clear()  # consumed, so the next wait blocks until another notify
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def _dispatch(payload: str):
+    try:
+        marker = json.loads(payload)
+    except json.JSONDecodeError:
+        logging.warning("Marker notification not JSON: %r", payload[:200])
+        return
+
+    with _subscribers_lock:
+        subs = list(_subscribers.get(marker.get("meeting_id"), ()))
+    for sub in subs:
+        sub.notify()
+
+
+def _listen_forever(conninfo: str):
+    import psycopg  # import here to avoid startup failures
+    backoff = 1
+    while True:
+        try:
+            # one dedicated autocommit connection shared by every waiting client,
+            # kept out of the pool so LISTEN doesn't pin a pooled connection
+            with psycopg.connect(conninfo, autocommit=True, connect_timeout=5) as conn:
+                conn.execute(f"LISTEN {MARKER_CHANNEL}")
+                logging.info("Marker feed listening on channel=%s", MARKER_CHANNEL)
+                backoff = 1
+                for note in conn.notifies():
+                    _dispatch(note.payload)
+        except Exception:
+            logging.exception("Marker feed listener failed, reconnecting in %ss", backoff)
+        # notifications sent while disconnected are lost, clients catch up by re-polling with `since`
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+def _ensure_listener():
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            # always the primary: NOTIFY isn't delivered to listeners on a read replica
+            conninfo = os.getenv("POSTGRES_URL")
+            if not conninfo:
+                raise RuntimeError("POSTGRES_URL is not set")
+            _listener = threading.Thread(
+                target=_listen_forever, args=(conninfo,), name="marker-feed-listener", daemon=True)
+            _listener.start()
+
+
+@contextmanager
+def subscribe(meeting_id: str):
+    """Register for new markers on a meeting from a coroutine.
+    Subscribe *before* reading the DB so nothing slips between the two."""
+    _ensure_listener()
+    sub = Subscription(meeting_id, asyncio.get_running_loop())
+    with _subscribers_lock:
+        _subscribers.setdefault(meeting_id, set()).add(sub)
+    try:
+        yield sub
+    finally:
+        with _subscribers_lock:
+            subs = _subscribers.get(meeting_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del _subscribers[meeting_id]
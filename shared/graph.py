@@ -1,106 +1,151 @@
 import os
+import time
 import msal
 import requests
 import logging
+import threading
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote
 
-GRAPH_TENANT_ID = os.getenv("GRAPH_TENANT_ID")
+GRAPH_TENANT_ID = os.getenv("GRAPH_TENANT_ID")  # default tenant when a call doesn't name one
 GRAPH_CLIENT_ID = os.getenv("GRAPH_CLIENT_ID")
 GRAPH_CLIENT_SECRET = os.getenv("GRAPH_CLIENT_SECRET")
-GRAPH_AUTHORITY = f"https://login.microsoftonline.com/{GRAPH_TENANT_ID}"
 GRAPH_SCOPE = ["https://graph.microsoft.com/.default"]
 GRAPH_ENDPOINT = "https://graph.microsoft.com/v1.0"
-
-_session = None
-_token = None
-
-def get_token():
-    #add token cache
-    global _session
-    global _token
-    if _token is None:
-        msal_client = msal.ConfidentialClientApplication(
-            GRAPH_CLIENT_ID,
-            authority=GRAPH_AUTHORITY,
-            client_credential=GRAPH_CLIENT_SECRET
+# pooled keep-alive connections per tenant, size it above the fan-out concurrency
+GRAPH_POOL_MAXSIZE = int(os.getenv("GRAPH_POOL_MAXSIZE", "32"))
+# tenants with no Graph calls for this long have their client (and connections) dropped
+GRAPH_CLIENT_IDLE_SECONDS = float(os.getenv("GRAPH_CLIENT_IDLE_SECONDS", "900"))
+
+class GraphClient:
+    """Token cache and pooled HTTP session for one tenant."""
+
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str):
+        self.tenant_id = tenant_id
+        self.last_used = time.monotonic()
+        self._msal = msal.ConfidentialClientApplication(
+            client_id,
+            authority=f"https://login.microsoftonline.com/{tenant_id}",
+            client_credential=client_secret
         )
-        result = msal_client.acquire_token_for_client(scopes=GRAPH_SCOPE)
+        self.session = requests.Session()
+        # block instead of opening throwaway connections when the fan-out exceeds the pool
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GRAPH_POOL_MAXSIZE, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+    def get_token(self):
+        # msal keeps app tokens in its in-memory cache and only calls Entra ID again near expiry
+        result = self._msal.acquire_token_for_client(scopes=GRAPH_SCOPE)
         if "access_token" in result:
-            _token = result["access_token"]
-        else:
-            raise Exception("Could not obtain access token")
-    return _token
-
-def _http():
-    global _session
-    if _session is None:
-        # create a requests session once and reuse it
-        _session = requests.Session()
-    # always ensure Authorization header is current
-    _session.headers.update({"Authorization": f"Bearer {get_token()}"})
-    return _session
+            return result["access_token"]
+        raise Exception(f"Could not obtain access token for tenant {self.tenant_id}")
+
+    def http(self):
+        # always ensure Authorization header is current
+        self.session.headers.update({"Authorization": f"Bearer {self.get_token()}"})
+        return self.session
+
+    def close(self):
+        self.session.close()
+
+_clients = {}  # tenant_id -> GraphClient
+_clients_lock = threading.Lock()
+
+def _evict_idle(now: float):
+    for tenant_id, client in list(_clients.items()):
+        if now - client.last_used > GRAPH_CLIENT_IDLE_SECONDS:
+            logging.info("Evicting idle Graph client tenant=%s", tenant_id)
+            del _clients[tenant_id]
+            client.close()
+
+def get_client(tenant_id: str = None) -> GraphClient:
+    """Graph client for a tenant (default GRAPH_TENANT_ID), created on first use and reused after."""
+    tenant_id = tenant_id or GRAPH_TENANT_ID
+    if not tenant_id:
+        raise RuntimeError("GRAPH_TENANT_ID is not set")
+    with _clients_lock:
+        _evict_idle(time.monotonic())
+        client = _clients.get(tenant_id)
+    if client is None:
+        # built outside the lock: msal fetches the tenant's OIDC metadata here, and a slow or failing
+        # lookup must not stall Graph calls for other tenants. One multi-tenant app registration,
+        # so credentials are shared and only the authority differs.
+        new_client = GraphClient(tenant_id, GRAPH_CLIENT_ID, GRAPH_CLIENT_SECRET)
+        with _clients_lock:
+            client = _clients.setdefault(tenant_id, new_client)
+        if client is not new_client:
+            new_client.close()  # another thread registered this tenant first
+    client.last_used = time.monotonic()
+    return client
+
+def get_token(tenant_id: str = None):
+    return get_client(tenant_id).get_token()
+
+def _http(tenant_id: str = None):
+    return get_client(tenant_id).http()
 
 # transcript graph api functions
-def list_transcripts(organizer_id: str, online_meeting_id: str):
+def list_transcripts(organizer_id: str, online_meeting_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings/{online_meeting_id}/transcripts"
-    response = _http().get(url)
+    response = _http(tenant_id).get(url)
     response.raise_for_status()
     return response.json().get("value", [])
 
-def get_transcript(organizer_id: str, online_meeting_id: str, transcript_id: str):
+def get_transcript(organizer_id: str, online_meeting_id: str, transcript_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings/{online_meeting_id}/transcripts/{transcript_id}"
-    response = _http().get(url, timeout=30)
+    response = _http(tenant_id).get(url, timeout=30)
     response.raise_for_status()
     return response.json()
 
-def get_all_transcripts(organizer_id: str):
+def get_all_transcripts(organizer_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/communications/onlineMeetings/getAllTranscripts"
-    response = _http().get(url, timeout=30)
+    response = _http(tenant_id).get(url, timeout=30)
     response.raise_for_status()
     return response.json().get("value", [])
 
-def get_transcript_content(organizer_id: str, online_meeting_id: str, transcript_id: str, fmt: str = "vtt"):
+def get_transcript_content(organizer_id: str, online_meeting_id: str, transcript_id: str, fmt: str = "vtt", tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings/{online_meeting_id}/transcripts/{transcript_id}/content"
     params = {"format": fmt} if fmt else None
-    response = _http().get(url, params=params, timeout=30)
+    response = _http(tenant_id).get(url, params=params, timeout=30)
     response.raise_for_status()
     return response.content, response.headers.get("Content-Type", "text/plain")
 
 # recording graph api functions
-def list_recordings(organizer_id: str, online_meeting_id: str):
+def list_recordings(organizer_id: str, online_meeting_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings/{online_meeting_id}/recordings"
-    response = _http().get(url)
+    response = _http(tenant_id).get(url)
     response.raise_for_status()
     return response.json().get("value", [])
 
-def get_recording(organizer_id: str, online_meeting_id: str, recording_id: str):
+def get_recording(organizer_id: str, online_meeting_id: str, recording_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings/{online_meeting_id}/recordings/{recording_id}"
-    response = _http().get(url, timeout=30)
+    response = _http(tenant_id).get(url, timeout=30)
     response.raise_for_status()
     return response.json()
 
-def get_all_recordings(organizer_id: str):
+def get_all_recordings(organizer_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/communications/onlineMeetings/getAllRecordings"
-    response = _http().get(url, timeout=30)
+    response = _http(tenant_id).get(url, timeout=30)
     response.raise_for_status()
     return response.json().get("value", [])
 
-def get_recording_content(organizer_id: str, online_meeting_id: str, recording_id: str):
+def get_recording_content(organizer_id: str, online_meeting_id: str, recording_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings/{online_meeting_id}/recordings/{recording_id}/content"
-    response = _http().get(url, timeout=30)
+    response = _http(tenant_id).get(url, timeout=30)
     response.raise_for_status()
     return response.content, response.headers.get("Content-Type", "text/plain")
 
-def resolve_meeting_by_join_url(join_web_url: str, organizer_id: str):
+def resolve_meeting_by_join_url(join_web_url: str, organizer_id: str, tenant_id: str = None):
     flt = f"JoinWebUrl eq '{join_web_url}'"
     flt_quoted = quote(flt, safe="= ':")
     url = f"{GRAPH_ENDPOINT}/users/{organizer_id}/onlineMeetings?$filter={flt_quoted}"
-    r = _http().get(url, timeout=30)
+    r = _http(tenant_id).get(url, timeout=30)
     r.raise_for_status()
     items = r.json().get("value", [])
     return items[0]["id"] if items else None
 
-def create_subscription(notification_url: str, client_state: str, organizer_id: str, expiration_date: str, resource: str):
+def create_subscription(notification_url: str, client_state: str, organizer_id: str, expiration_date: str, resource: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/subscriptions"
     payload = {
         "changeType": "created",
@@ -112,9 +157,9 @@ def create_subscription(notification_url: str, client_state: str, organizer_id:
     }
     #print("Creating subscription with payload:", payload)
     #print(_token)
-    ah = _http().headers.get("Authorization","")
+    ah = _http(tenant_id).headers.get("Authorization","")
     #logging.info("Auth header starts with: %r", ah[:12]) 
-    r = _http().post(url, json=payload, timeout=30)
+    r = _http(tenant_id).post(url, json=payload, timeout=30)
     #logging.info("Create sub status=%s body=%s", r.status_code, r.text if r.status_code>=400 else "<ok>")
     if r.status_code >= 400:
         logging.error("Graph create_subscription failed: %s\n%s",
@@ -122,33 +167,33 @@ def create_subscription(notification_url: str, client_state: str, organizer_id:
     r.raise_for_status()
     return r.json()
 
-def list_subscriptions():
+def list_subscriptions(tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/subscriptions"
-    r = _http().get(url, timeout=30)
+    r = _http(tenant_id).get(url, timeout=30)
     r.raise_for_status()
     return r.json().get("value", [])
 
-def reauthorize_subscription(subscription_id: str):
+def reauthorize_subscription(subscription_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/subscriptions/{subscription_id}/reauthorize"
-    r = _http().post(url, timeout=30)
+    r = _http(tenant_id).post(url, timeout=30)
     r.raise_for_status()
     return r.json()
 
-def renew_subscription(subscription_id: str, new_expiration_date: str):
+def renew_subscription(subscription_id: str, new_expiration_date: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/subscriptions/{subscription_id}"
     payload = {
         "expirationDateTime": new_expiration_date
     }
     print(type(new_expiration_date))
     print("Renewing subscription with payload:", payload)
-    r = _http().patch(url, json=payload, timeout=30)
+    r = _http(tenant_id).patch(url, json=payload, timeout=30)
     if r.status_code >= 400:
         logging.error("Graph renew_subscription failed: %s\n%s",
                     r.status_code, r.text)
     r.raise_for_status()
     return r.json()
 
-def delete_subscription(subscription_id: str):
+def delete_subscription(subscription_id: str, tenant_id: str = None):
     url = f"{GRAPH_ENDPOINT}/subscriptions/{subscription_id}"
-    r = _http().delete(url, timeout=30)
+    r = _http(tenant_id).delete(url, timeout=30)
     r.raise_for_status()
@@ -0,0 +1,72 @@
+"""Export markers joined with meeting metadata over a time range as CSV, JSONL or Parquet.
+
+Rows are streamed from Postgres through a server-side cursor and written in chunks, so memory
+stays flat however many rows the range holds.
+
+    python -m tools.export_markers --start 2025-10-01 --end 2025-11-01 --format parquet -o markers.parquet
+"""
+import os
+import sys
+import time
+import argparse
+import datetime as dt
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _utc(value: str) -> dt.datetime:
+    parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt.timezone.utc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", type=_utc, required=True, help="inclusive ISO timestamp (UTC if no offset)")
+    parser.add_argument("--end", type=_utc, required=True, help="exclusive ISO timestamp (UTC if no offset)")
+    parser.add_argument("--format", choices=("csv", "jsonl", "parquet"), default="csv")
+    parser.add_argument("-o", "--output", help="output file (default: stdout, not allowed for parquet)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows fetched and written per chunk")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and not args.output:
+        parser.error("--output is required for parquet")
+
+    load_dotenv()
+    import psycopg
+    from shared import export
+
+    # read-only, so prefer the replica when one is configured
+    conninfo = os.getenv("POSTGRES_READ_URL") or os.getenv("POSTGRES_URL")
+    if not conninfo:
+        raise SystemExit("POSTGRES_URL is not set")
+
+    started = time.monotonic()
+    rows = 0
+
+    def counted(chunks):
+        nonlocal rows
+        for chunk in chunks:
+            rows += len(chunk)
+            yield chunk
+
+    with psycopg.connect(conninfo, connect_timeout=5) as conn:
+        if args.format == "parquet":
+            export.write_parquet(counted(export.iter_chunks(conn, args.start, args.end, args.chunk_size)), args.output)
+        else:
+            # same writers as the export_markers route, so both produce identical text for a range
+            write = export.write_csv if args.format == "csv" else export.write_jsonl
+            out = open(args.output, "w", newline="") if args.output else sys.stdout
+            try:
+                write(counted(export.iter_chunks(conn, args.start, args.end, args.chunk_size)), out)
+            finally:
+                if args.output:
+                    out.close()
+
+    elapsed = time.monotonic() - started
+    print(f"Exported {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Replay a JSONL file of captured or dead-lettered Event Grid events through the process_meeting logic.
+
+Each line is one event, a list of events, or a raw Service Bus message body. Lines are processed in
+chunks across a worker process pool, each worker with its own DB pool and bounded Graph concurrency.
+Completed chunks are appended to a checkpoint file so an interrupted run resumes where it stopped.
+
+    python -m tools.replay_events events.jsonl --workers 4 --graph-concurrency 4
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from dotenv import load_dotenv
+
+# make function_app importable when run as a script from anywhere
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _replay_chunk(chunk_id: int, lines: list, graph_concurrency: int):
+    """Runs in a worker process: parse, resolve and upsert one chunk of lines."""
+    import function_app
+    from shared import graph
+
+    events = []
+    bad = 0
+    for line in lines:
+        try:
+            payload = json.loads(line)
+        except json.JSONDecodeError:
+            bad += 1
+            continue
+        for ev in [payload] if isinstance(payload, dict) else payload:
+            # lifecycle events renew/recreate live subscriptions, never replay those
+            if isinstance(ev, dict) and not function_app.is_lifecycle_event(ev):
+                events.append(ev)
+
+    per_item, per_org = function_app.collect_meeting_work(events, graph)
+    rows, failed = function_app.resolve_meetings(graph, per_item, per_org, max_workers=graph_concurrency)
+    function_app.upsert_meetings(rows)
+    return chunk_id, len(events), len(rows), len(failed), bad
+
+
+def _read_checkpoint(path: str, chunk_size: int):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry["chunk_size"] != chunk_size:
+                raise SystemExit(f"Checkpoint {path} was written with --chunk-size {entry['chunk_size']}")
+            done.add(entry["chunk"])
+    return done
+
+
+def _chunks(path: str, chunk_size: int):
+    with open(path) as f:
+        lines = (line for line in f if line.strip())
+        chunk_id = 0
+        while True:
+            chunk = list(islice(lines, chunk_size))
+            if not chunk:
+                return
+            yield chunk_id, chunk
+            chunk_id += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="JSONL file of events")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="worker processes")
+    parser.add_argument("--graph-concurrency", type=int, default=4, help="concurrent Graph calls per worker")
+    parser.add_argument("--chunk-size", type=int, default=200, help="lines per unit of work")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <path>.ckpt)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    checkpoint = args.checkpoint or f"{args.path}.ckpt"
+    done = _read_checkpoint(checkpoint, args.chunk_size)
+    if done:
+        print(f"Resuming: {len(done)} chunks already done")
+
+    started = time.monotonic()
+    last_report = started
+    totals = {"events": 0, "meetings": 0, "failed": 0, "bad_lines": 0, "chunks": 0, "chunk_errors": 0}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as ex, open(checkpoint, "a") as ckpt:
+        in_flight = {}
+        chunks = ((cid, c) for cid, c in _chunks(args.path, args.chunk_size) if cid not in done)
+
+        def drain(block_until):
+            nonlocal last_report
+            finished, _ = wait(in_flight, return_when=block_until)
+            for fut in finished:
+                cid = in_flight.pop(fut)
+                try:
+                    _, n_events, n_meetings, n_failed, n_bad = fut.result()
+                except Exception:
+                    logging.exception("Chunk %d failed, will retry on next run", cid)
+                    totals["chunk_errors"] += 1
+                    continue
+                totals["events"] += n_events
+                totals["meetings"] += n_meetings
+                totals["failed"] += n_failed
+                totals["bad_lines"] += n_bad
+                totals["chunks"] += 1
+                # chunks with failed Graph lookups are left out of the checkpoint so a rerun retries them
+                if not n_failed:
+                    ckpt.write(json.dumps({"chunk": cid, "chunk_size": args.chunk_size}) + "\n")
+                    ckpt.flush()
+            now = time.monotonic()
+            if now - last_report >= 10:
+                last_report = now
+                print(f"{totals['events']} events, {totals['meetings']} meetings "
+                      f"({totals['events'] / (now - started):.1f} events/s)")
+
+        # keep a bounded number of chunks in flight so memory stays flat on large files
+        for cid, chunk in chunks:
+            if len(in_flight) >= args.workers * 2:
+                drain(FIRST_COMPLETED)
+            in_flight[ex.submit(_replay_chunk, cid, chunk, args.graph_concurrency)] = cid
+        while in_flight:
+            drain(FIRST_COMPLETED)
+
+    elapsed = time.monotonic() - started
+    print(f"Done: {totals['chunks']} chunks, {totals['events']} events, {totals['meetings']} meetings upserted, "
+          f"{totals['failed']} failed lookups, {totals['chunk_errors']} failed chunks, "
+          f"{totals['bad_lines']} bad lines in {elapsed:.1f}s "
+          f"({totals['events'] / elapsed if elapsed else 0:.1f} events/s)")
+    return 1 if totals["failed"] or totals["chunk_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())